@@ -0,0 +1,198 @@
+import json
+import os
+import re
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+from typing import Callable, Optional
+
+from rate_limiter import domain_of
+
+# Restores saved localStorage into a pre-launched context; keys the site has since set are left alone
+_LOCAL_STORAGE_SCRIPT = """(() => {
+  const items = (%s)[location.origin];
+  if (!items) return;
+  try {
+    for (const [key, value] of items) {
+      if (localStorage.getItem(key) === null) localStorage.setItem(key, value);
+    }
+  } catch (e) {}
+})();"""
+
+
+class BrowserPool:
+    """
+    Pool of warm Playwright browser contexts, keyed by domain.
+
+    Contexts are reused across visits so cookies, consent choices, the HTTP cache and
+    service workers survive between graph steps. A context is recycled after `max_uses`
+    leases or once the highest JS heap seen on its pages (CDP Performance.getMetrics, a
+    best-effort signal) passes `max_heap_mb`, and dropped if its page crashes or cannot be
+    closed. When `storage_dir` is set, each domain's storage state (cookies + localStorage)
+    is saved there and loaded into a pre-launched context on the next visit, so it also
+    survives between runs.
+
+    `on_page` is called with every leased page. When `trace_dir` is set, each context records a
+    Playwright trace (network waterfall, snapshots) written there when the context is closed.
+
+    Playwright's sync API is bound to the thread that started it, so use one pool per thread.
+    """
+    def __init__(self, playwright, size: int = 2, max_uses: int = 20, max_heap_mb: float = 256.0,
+                 storage_dir: Optional[str] = 'browser_state', headless: bool = True,
+                 on_page: Optional[Callable] = None, trace_dir: Optional[str] = None):
+        self.size = size
+        self.max_uses = max_uses
+        self.max_heap_mb = max_heap_mb
+        self.storage_dir = storage_dir
+        self.on_page = on_page
+        self.trace_dir = trace_dir
+        self._traces = 0
+        self._playwright = playwright
+        self._browser = playwright.chromium.launch(headless=headless)
+        self._idle = OrderedDict()  # domain -> (context, uses, peak heap MB), least recently used first
+        if storage_dir:
+            os.makedirs(storage_dir, exist_ok=True)
+        if trace_dir:
+            os.makedirs(trace_dir, exist_ok=True)
+        self._spare = []  # pre-launched, no domain yet
+        self._refill_spare()
+
+    def _new_context(self, **kwargs):
+        context = self._browser.new_context(**kwargs)
+        if self.trace_dir:
+            context.tracing.start(screenshots=True, snapshots=True)
+        return context
+
+    def _close_context(self, context):
+        if self.trace_dir:
+            self._traces += 1
+            path = os.path.join(self.trace_dir, f"trace_{self._traces}.zip")
+            try:
+                context.tracing.stop(path=path)
+                print(f"[BrowserPool] Saved trace: {path}")
+            except Exception as e:
+                print(f"[BrowserPool] Could not save trace: {e}")
+        try:
+            context.close()
+        except Exception as e:
+            print(f"[BrowserPool] Could not close context: {e}")
+
+    def _refill_spare(self):
+        try:
+            while len(self._spare) < self.size:
+                self._spare.append(self._new_context())
+        except Exception as e:
+            print(f"[BrowserPool] Could not pre-launch context: {e}")
+
+    def _storage_path(self, domain: str) -> Optional[str]:
+        if not self.storage_dir:
+            return None
+        return os.path.join(self.storage_dir, re.sub(r'[^a-zA-Z0-9_.-]', '_', domain) + '.json')
+
+    def _seed(self, context, path: str):
+        """Load a saved storage state into an already-running context."""
+        with open(path) as f:
+            state = json.load(f)
+        if state.get('cookies'):
+            context.add_cookies(state['cookies'])
+        origins = {o['origin']: [[item['name'], item['value']] for item in o.get('localStorage', [])]
+                   for o in state.get('origins', [])}
+        if origins:
+            context.add_init_script(script=_LOCAL_STORAGE_SCRIPT % json.dumps(origins))
+
+    def _acquire(self, domain: str):
+        if domain in self._idle:
+            return self._idle.pop(domain)
+        path = self._storage_path(domain)
+        has_state = bool(path and os.path.exists(path))
+        if self._spare:
+            context = self._spare.pop()
+            if not has_state:
+                return context, 0, None
+            try:
+                self._seed(context, path)
+                return context, 0, None
+            except Exception as e:
+                print(f"[BrowserPool] Could not seed spare context for {domain}: {e}")
+                self._close_context(context)
+        if has_state:
+            return self._new_context(storage_state=path), 0, None
+        return self._new_context(), 0, None
+
+    def _heap_mb(self, context, page) -> Optional[float]:
+        """JSHeapUsedSize of `page` in MB via CDP, or None when unavailable."""
+        try:
+            cdp = context.new_cdp_session(page)
+            try:
+                cdp.send('Performance.enable')
+                metrics = cdp.send('Performance.getMetrics')['metrics']
+            finally:
+                cdp.detach()
+            for metric in metrics:
+                if metric['name'] == 'JSHeapUsedSize':
+                    return metric['value'] / (1024 * 1024)
+        except Exception:
+            pass
+        return None
+
+    def _release(self, domain: str, context, uses: int, healthy: bool, peak_mb: Optional[float] = None):
+        if not healthy:
+            print(f"[BrowserPool] Dropping broken context for {domain}")
+            self._close_context(context)
+            self._refill_spare()
+            return
+        path = self._storage_path(domain)
+        if path:
+            try:
+                context.storage_state(path=path)
+            except Exception as e:
+                print(f"[BrowserPool] Could not save storage state for {domain}: {e}")
+        if uses >= self.max_uses or (peak_mb is not None and peak_mb > self.max_heap_mb):
+            heap = f"{peak_mb:.0f}MB" if peak_mb is not None else 'n/a'
+            print(f"[BrowserPool] Recycling context for {domain} (uses={uses}, peak heap={heap})")
+            self._close_context(context)
+        else:
+            self._idle[domain] = (context, uses, peak_mb)
+            while len(self._idle) > self.size:
+                _, (old, _, _) = self._idle.popitem(last=False)
+                self._close_context(old)
+        self._refill_spare()
+
+    @contextmanager
+    def page(self, url: str):
+        """Lease a new page in a warm context for `url`'s domain; the context is returned on exit."""
+        domain = domain_of(url)
+        context, uses, peak_mb = self._acquire(domain)
+        try:
+            page = context.new_page()
+        except Exception:
+            self._release(domain, context, uses, healthy=False)
+            raise
+        crashed = []
+        page.on('crash', lambda _: crashed.append(True))
+        if self.on_page:
+            self.on_page(page)
+        started = time.monotonic()
+        try:
+            yield page
+        finally:
+            healthy = not crashed
+            heap_mb = self._heap_mb(context, page) if healthy else None
+            if heap_mb is not None:
+                peak_mb = max(peak_mb or 0.0, heap_mb)
+            try:
+                page.close()
+            except Exception as e:
+                print(f"[BrowserPool] Could not close page for {domain}: {e}")
+                healthy = False
+            print(f"[BrowserPool] Released {domain} context after {time.monotonic() - started:.1f}s")
+            self._release(domain, context, uses + 1, healthy, peak_mb)
+
+    def close(self):
+        for context, _, _ in self._idle.values():
+            self._close_context(context)
+        for context in self._spare:
+            self._close_context(context)
+        self._idle.clear()
+        self._spare = []
+        self._browser.close()
@@ -0,0 +1,224 @@
+import re
+from typing import Dict, Iterable, List, Optional, Tuple
+from bs4 import BeautifulSoup, Tag
+
+# --- Keyword Sets ---
+# Phrases that suggest a data removal / opt-out path, grouped by language.
+# Matched as whole words, so list the inflections as well rather than stems.
+KEYWORDS: Dict[str, List[str]] = {
+    'en': ['remove', 'removed', 'removing', 'removal', 'do not use', 'opt out', 'opt-out', 'optout',
+           'opting out', 'opted out', 'delete', 'deleted', 'deleting', 'deletion', 'privacy',
+           'do not sell', 'unsubscribe', 'unsubscribed'],
+    'de': ['entfernen', 'löschen', 'datenschutz', 'widerspruch', 'abmelden', 'nicht verkaufen'],
+    'fr': ['supprimer', 'suppression', 'désinscrire', 'désabonner', 'confidentialité', 'ne pas vendre'],
+    'es': ['eliminar', 'borrar', 'darse de baja', 'privacidad', 'no vender'],
+    'it': ['rimuovi', 'cancellazione', 'disiscriviti', 'riservatezza', 'non vendere'],
+    'pt': ['remover', 'excluir', 'descadastrar', 'privacidade', 'não vender'],
+}
+
+DEFAULT_LANGUAGES = ['en']
+
+EMAIL_RE = re.compile(r'[\w\.-]+@[\w\.-]+')
+CAPTCHA_SCRIPT_RE = re.compile(
+    r'(?P<recaptcha>recaptcha/api\.js)|(?P<funcaptcha>funcaptcha\.com)|(?P<geetest>geetest\.com)'
+    r'|(?P<keycaptcha>keycaptcha\.com)|(?P<capy>api\.capy\.me)'
+)
+CANVAS_TEXT_RE = re.compile(r'grid|canvas|click captcha|rotate', re.I)
+TEXT_CAPTCHA_RE = re.compile(r'(type the text|enter the answer|what day|solve|question)', re.I)
+TEXT_CAPTCHA_TAGS = {'label', 'span', 'div', 'p'}
+TEXT_SKIP_TAGS = {'script', 'style'}
+
+
+class KeywordMatcher:
+    """Case-insensitive whole-word multi-keyword matcher backed by a single precompiled regex."""
+    def __init__(self, keywords: Iterable[str]):
+        self.keywords = sorted({kw.lower() for kw in keywords if kw}, key=len, reverse=True)
+        self._pattern = re.compile(r'\b(?:' + '|'.join(re.escape(kw) for kw in self.keywords) + r')\b', re.I)
+
+    @classmethod
+    def from_languages(cls, languages: Optional[Iterable[str]] = None, extra: Iterable[str] = ()):
+        """Build a matcher from KEYWORDS for the given language codes (English when None)."""
+        languages = DEFAULT_LANGUAGES if languages is None else languages
+        keywords = [kw for lang in languages for kw in KEYWORDS.get(lang.strip(), [])]
+        return cls(keywords + list(extra))
+
+    def search(self, text: str) -> Optional[str]:
+        """Return the first keyword found in `text`, or None."""
+        match = self._pattern.search(text)
+        return match.group(0) if match else None
+
+
+DEFAULT_MATCHER = KeywordMatcher.from_languages()
+
+
+def _candidate_selector(tag: Tag) -> str:
+    if tag.name == 'a' and tag.get('href'):
+        return f"a[href='{tag.get('href')}']"
+    elif tag.name == 'button' and tag.get('id'):
+        return f"button#{tag.get('id')}"
+    elif tag.name == 'input' and tag.get('name'):
+        return f"input[name='{tag.get('name')}']"
+    return str(tag)[:80]  # fallback: truncated HTML
+
+
+def scan_page(html: str, matcher: Optional[KeywordMatcher] = None) -> dict:
+    """
+    Parse `html` once and walk the DOM a single time, collecting everything the agent steps need:
+      - candidates: removal-related links/buttons/inputs followed by matching forms
+      - removal_hint: first removal keyword found in text or attribute values
+      - emails: email addresses in document order, de-duplicated
+      - forms: all <form> tags
+      - captcha: raw captcha signals, see detect_captcha()
+    """
+    matcher = matcher or DEFAULT_MATCHER
+    soup = BeautifulSoup(html, 'html.parser')
+    candidates = []
+    form_candidates = []
+    forms = []
+    emails = []
+    removal_hint = None
+    captcha = {
+        'recaptcha_div': None,
+        'recaptcha_script': None,
+        'sitekey_tag': None,
+        'grecaptcha_execute': False,
+        'script_types': set(),
+        'canvas': False,
+        'canvas_text': False,
+        'captcha_img': None,
+        'text_question': None,
+    }
+    # Text-captcha bookkeeping, all keyed by id(tag) so each tag is visited once:
+    # owner = nearest label/div/p (or outermost span) collecting the tag's inline text,
+    # form = enclosing <form>
+    owner_of = {}
+    form_of = {}
+    owner_text = {}  # id(owner) -> (owner, [text pieces]), in document order
+    captcha_input_forms = set()
+
+    def scan_value(value: str):
+        nonlocal removal_hint
+        if removal_hint is None:
+            removal_hint = matcher.search(value)
+        if '@' in value:
+            for email in EMAIL_RE.findall(value):
+                if email not in emails:
+                    emails.append(email)
+
+    for node in soup.descendants:
+        if not isinstance(node, Tag):
+            text = str(node)
+            scan_value(text)
+            parent = node.parent.name if node.parent else None
+            if parent == 'script' and 'grecaptcha.execute' in text:
+                captcha['grecaptcha_execute'] = True
+            if not captcha['canvas_text'] and CANVAS_TEXT_RE.search(text):
+                captcha['canvas_text'] = True
+            owner = owner_of.get(id(node.parent))
+            if owner is not None and parent not in TEXT_SKIP_TAGS:
+                owner_text.setdefault(id(owner), (owner, []))[1].append(text)
+            continue
+
+        parent_owner = owner_of.get(id(node.parent))
+        if node.name in ('label', 'div', 'p') or (node.name == 'span' and parent_owner is None):
+            owner_of[id(node)] = node
+        else:
+            owner_of[id(node)] = parent_owner
+        form_of[id(node)] = node if node.name == 'form' else form_of.get(id(node.parent))
+        if node.name == 'input' and 'captcha' in (node.get('name', '') + node.get('id', '')).lower():
+            if form_of[id(node)] is not None:
+                captcha_input_forms.add(id(form_of[id(node)]))
+
+        for value in node.attrs.values():
+            if isinstance(value, str):
+                scan_value(value)
+        name = node.name
+        if name in ('a', 'button', 'input'):
+            text = ((node.get_text() or '').strip() + ' ' + (node.get('value') or '')).strip()
+            if matcher.search(text):
+                candidates.append({'text': text, 'type': name, 'selector': _candidate_selector(node)})
+        elif name == 'form':
+            forms.append(node)
+            form_text = node.get_text(separator=' ', strip=True)
+            if matcher.search(form_text):
+                form_candidates.append({'text': form_text[:100], 'type': 'form', 'selector': 'form'})
+        elif name == 'script' and node.get('src'):
+            for match in CAPTCHA_SCRIPT_RE.finditer(node['src']):
+                captcha['script_types'].add(match.lastgroup)
+                if match.lastgroup == 'recaptcha' and captcha['recaptcha_script'] is None:
+                    captcha['recaptcha_script'] = node
+        elif name == 'div' and captcha['recaptcha_div'] is None:
+            if any('g-recaptcha' in cls for cls in node.get('class', [])):
+                captcha['recaptcha_div'] = node
+        elif name == 'canvas':
+            captcha['canvas'] = True
+        elif name == 'img' and captcha['captcha_img'] is None:
+            if 'captcha' in (node.get('src', '') + node.get('alt', '')).lower():
+                captcha['captcha_img'] = node
+        if captcha['sitekey_tag'] is None and node.has_attr('data-sitekey'):
+            captcha['sitekey_tag'] = node
+
+    captcha['text_question'] = _pick_text_question(owner_text.values(), form_of, captcha_input_forms)
+
+    return {
+        'candidates': candidates + form_candidates,
+        'removal_hint': removal_hint,
+        'emails': emails,
+        'forms': forms,
+        'captcha': captcha,
+    }
+
+
+def _pick_text_question(owners, form_of: dict, captcha_input_forms: set) -> Optional[str]:
+    """
+    Choose the text-captcha prompt among elements whose own inline text matches TEXT_CAPTCHA_RE.
+    Prefer a match in a form with a captcha input, then any form match, then the first match.
+    """
+    best = None
+    for owner, pieces in owners:
+        text = ' '.join(''.join(pieces).split())
+        if not TEXT_CAPTCHA_RE.search(text):
+            continue
+        form = form_of.get(id(owner))
+        rank = 0 if form is not None and id(form) in captcha_input_forms else 1 if form is not None else 2
+        if best is None or rank < best[0]:
+            best = (rank, text)
+    return best[1] if best else None
+
+
+def detect_captcha(signals: dict) -> Tuple[Optional[str], dict]:
+    """Resolve scan_page() captcha signals into (captcha_type, captcha_data)."""
+    captcha_type = None
+    captcha_data = {}
+    recaptcha_div = signals['recaptcha_div']
+    recaptcha_script = signals['recaptcha_script']
+    script_types = signals['script_types']
+    if recaptcha_div or recaptcha_script:
+        sitekey = None
+        if recaptcha_div and recaptcha_div.has_attr('data-sitekey'):
+            sitekey = recaptcha_div['data-sitekey']
+        elif signals['sitekey_tag'] is not None:
+            sitekey = signals['sitekey_tag']['data-sitekey']
+        if sitekey:
+            if signals['grecaptcha_execute'] or 'v3' in str(recaptcha_script):
+                captcha_type = 'recaptcha_v3'
+            else:
+                captcha_type = 'recaptcha_v2'
+            captcha_data['sitekey'] = sitekey
+    elif 'funcaptcha' in script_types:
+        captcha_type = 'funcaptcha'
+    elif 'geetest' in script_types:
+        captcha_type = 'geetest'
+    elif 'keycaptcha' in script_types:
+        captcha_type = 'keycaptcha'
+    elif 'capy' in script_types:
+        captcha_type = 'capy'
+    elif signals['canvas'] or signals['canvas_text']:
+        captcha_type = 'canvas_like'
+    elif signals['captcha_img'] is not None:
+        captcha_type = 'normal'
+        captcha_data['img_src'] = signals['captcha_img'].get('src')
+    if not captcha_type and signals['text_question']:
+        captcha_type = 'text'
+        captcha_data['question'] = signals['text_question']
+    return captcha_type, captcha_data
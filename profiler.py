@@ -0,0 +1,106 @@
+import io
+import os
+import pstats
+import threading
+import time
+from contextlib import contextmanager
+from typing import List, Optional
+
+
+class ServiceTimer:
+    """Thread-safe wall-clock totals for calls to external services (Claude, 2Captcha, ...)."""
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._totals = {}
+
+    @contextmanager
+    def track(self, service: str):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            elapsed = time.perf_counter() - started
+            with self._lock:
+                count, total, longest = self._totals.get(service, (0, 0.0, 0.0))
+                self._totals[service] = (count + 1, total + elapsed, max(longest, elapsed))
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            return dict(self._totals)
+
+    def reset(self):
+        with self._lock:
+            self._totals.clear()
+
+
+SERVICE_TIMER = ServiceTimer()
+
+
+class NetworkRecorder:
+    """Collects per-request timings from Playwright page events."""
+    def __init__(self):
+        self.requests: List[dict] = []
+
+    def attach(self, page):
+        page.on('requestfinished', lambda request: self._record(request, None))
+        page.on('requestfailed', lambda request: self._record(request, request.failure))
+
+    def _record(self, request, failure: Optional[str]):
+        timing = request.timing or {}
+        end = timing.get('responseEnd', -1)
+        self.requests.append({
+            'url': request.url,
+            'method': request.method,
+            'resource_type': request.resource_type,
+            'duration_ms': end if end is not None and end >= 0 else None,
+            'failure': failure,
+        })
+
+
+def format_report(title: str, wall_seconds: float, profile, tracemalloc_snapshot,
+                  network: List[dict], services: dict, top: int = 25,
+                  error: Optional[BaseException] = None) -> str:
+    """Combine cProfile stats, tracemalloc allocations, network timings and service timings into one text report."""
+    out = io.StringIO()
+    out.write(f"Profile report: {title}\n")
+    if error is not None:
+        out.write(f"Run FAILED: {type(error).__name__}: {error}\n")
+    out.write(f"Total wall time: {wall_seconds:.2f}s\n")
+
+    out.write("\n=== External services ===\n")
+    if not services:
+        out.write("  (no calls)\n")
+    for service, (count, total, longest) in sorted(services.items(), key=lambda kv: -kv[1][1]):
+        out.write(f"  {service:<12} calls={count:<4} total={total:.3f}s max={longest:.3f}s\n")
+
+    out.write(f"\n=== Top {top} functions by cumulative time ===\n")
+    stats = pstats.Stats(profile, stream=out)
+    stats.sort_stats('cumulative').print_stats(top)
+    out.write(f"\n=== Top {top} functions by own time ===\n")
+    stats.sort_stats('tottime').print_stats(top)
+
+    out.write(f"\n=== Top {top} allocation sites ===\n")
+    for stat in tracemalloc_snapshot.statistics('lineno')[:top]:
+        out.write(f"  {stat}\n")
+
+    out.write("\n=== Network requests (slowest first) ===\n")
+    if not network:
+        out.write("  (no requests recorded)\n")
+    for req in sorted(network, key=lambda r: -(r['duration_ms'] or 0)):
+        duration = f"{req['duration_ms']:.0f}ms" if req['duration_ms'] is not None else '-'
+        status = f" FAILED: {req['failure']}" if req['failure'] else ''
+        out.write(f"  {duration:>8} {req['method']:<6} {req['resource_type']:<10} {req['url'][:120]}{status}\n")
+    return out.getvalue()
+
+
+def write_profile(run_dir: str, title: str, wall_seconds: float, profile, tracemalloc_snapshot,
+                  network: List[dict], services: dict, top: int = 25,
+                  error: Optional[BaseException] = None) -> str:
+    """Write cpu.prof and report.txt into `run_dir` and return the report path."""
+    profile.dump_stats(os.path.join(run_dir, 'cpu.prof'))
+    report = format_report(title, wall_seconds, profile, tracemalloc_snapshot, network, services,
+                           top=top, error=error)
+    report_path = os.path.join(run_dir, 'report.txt')
+    with open(report_path, 'w') as f:
+        f.write(report)
+    return report_path
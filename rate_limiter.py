@@ -0,0 +1,248 @@
+import threading
+import time
+from contextlib import contextmanager
+from typing import Callable, Dict, Optional
+from urllib.parse import urlparse
+
+# Responses that mean "slow down" rather than "this page has no removal path"
+RETRYABLE_STATUSES = {429, 500, 502, 503, 504}
+
+
+def domain_of(url: str) -> str:
+    """Return the lower-cased host of a URL without a leading 'www.'."""
+    host = (urlparse(url).hostname or url).lower()
+    return host[4:] if host.startswith('www.') else host
+
+
+class DomainUnavailable(Exception):
+    """Raised when a domain is throttling us or its circuit is open.
+
+    `retry_at` is a time.monotonic() timestamp after which the broker may be requeued.
+    """
+    def __init__(self, domain: str, retry_at: float, reason: str):
+        super().__init__(f"{domain} unavailable until {retry_at:.1f}: {reason}")
+        self.domain = domain
+        self.retry_at = retry_at
+        self.reason = reason
+
+
+# --- Circuit Breaker ---
+class CircuitBreaker:
+    """Per-domain circuit breaker.
+
+    After `failure_threshold` consecutive failures a domain is parked for
+    `reset_timeout` seconds. Once the timeout passes a single trial request is
+    let through (half-open); success closes the circuit, failure parks the
+    domain again with the timeout doubled (capped at `max_reset_timeout`).
+    """
+    def __init__(self, failure_threshold: int = 3, reset_timeout: float = 120.0,
+                 max_reset_timeout: float = 1800.0, clock: Callable[[], float] = time.monotonic):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.max_reset_timeout = max_reset_timeout
+        self.clock = clock
+        self._lock = threading.Lock()
+        self._domains: Dict[str, dict] = {}
+
+    def _get(self, domain: str) -> dict:
+        if domain not in self._domains:
+            self._domains[domain] = {
+                'failures': 0,
+                'open_until': None,
+                'timeout': self.reset_timeout,
+                'trial_in_flight': False,
+            }
+        return self._domains[domain]
+
+    def admit(self, domain: str) -> Optional[str]:
+        """Return 'closed' or 'trial' if a request may go ahead, None if the domain is parked."""
+        with self._lock:
+            d = self._get(domain)
+            if d['open_until'] is None:
+                return 'closed'
+            if self.clock() < d['open_until'] or d['trial_in_flight']:
+                return None
+            d['trial_in_flight'] = True
+            return 'trial'
+
+    def allow(self, domain: str) -> bool:
+        return self.admit(domain) is not None
+
+    def abandon_trial(self, domain: str) -> None:
+        """Let another trial through if the current one ended without a recorded outcome."""
+        with self._lock:
+            self._get(domain)['trial_in_flight'] = False
+
+    def is_open(self, domain: str) -> bool:
+        with self._lock:
+            return self._get(domain)['open_until'] is not None
+
+    def retry_at(self, domain: str) -> float:
+        with self._lock:
+            d = self._get(domain)
+            return d['open_until'] if d['open_until'] is not None else self.clock()
+
+    def record_success(self, domain: str) -> None:
+        with self._lock:
+            d = self._get(domain)
+            d['failures'] = 0
+            d['open_until'] = None
+            d['timeout'] = self.reset_timeout
+            d['trial_in_flight'] = False
+
+    def record_failure(self, domain: str) -> None:
+        with self._lock:
+            d = self._get(domain)
+            d['failures'] += 1
+            if d['trial_in_flight']:
+                d['trial_in_flight'] = False
+                d['timeout'] = min(d['timeout'] * 2, self.max_reset_timeout)
+                d['open_until'] = self.clock() + d['timeout']
+                print(f"[RateLimit] Circuit re-opened for {domain} ({d['timeout']:.0f}s)")
+            elif d['failures'] >= self.failure_threshold and d['open_until'] is None:
+                d['open_until'] = self.clock() + d['timeout']
+                print(f"[RateLimit] Circuit opened for {domain} after {d['failures']} failures ({d['timeout']:.0f}s)")
+
+
+# --- Adaptive Rate Limiter ---
+class DomainRateLimiter:
+    """Shared per-domain pacing with AIMD concurrency.
+
+    Each domain gets its own concurrency limit and minimum spacing between
+    requests. Successes grow the limit additively and shrink the spacing;
+    429/5xx/timeouts halve the limit and double the spacing. Requests to
+    other domains are never blocked by a slow one, and a request is never held
+    back longer than `max_wait` seconds: past that it raises DomainUnavailable
+    so the worker can move on. Retry-After is honoured up to `max_retry_after`.
+    """
+    def __init__(self, initial_concurrency: int = 1, max_concurrency: int = 4,
+                 min_interval: float = 1.0, max_interval: float = 60.0,
+                 max_wait: float = 10.0, max_retry_after: float = 600.0,
+                 breaker: Optional[CircuitBreaker] = None,
+                 clock: Callable[[], float] = time.monotonic,
+                 sleep: Callable[[float], None] = time.sleep):
+        self.initial_concurrency = initial_concurrency
+        self.max_concurrency = max_concurrency
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self.max_wait = max_wait
+        self.max_retry_after = max_retry_after
+        self.breaker = breaker or CircuitBreaker(clock=clock)
+        self.clock = clock
+        self.sleep = sleep
+        self._cond = threading.Condition()
+        self._domains: Dict[str, dict] = {}
+
+    def _get(self, domain: str) -> dict:
+        if domain not in self._domains:
+            self._domains[domain] = {
+                'limit': float(self.initial_concurrency),
+                'in_flight': 0,
+                'interval': self.min_interval,
+                'next_allowed': 0.0,
+            }
+        return self._domains[domain]
+
+    def limit(self, url: str) -> int:
+        with self._cond:
+            return int(self._get(domain_of(url))['limit'])
+
+    def interval(self, url: str) -> float:
+        with self._cond:
+            return self._get(domain_of(url))['interval']
+
+    @contextmanager
+    def slot(self, url: str):
+        """Block until a request to `url`'s domain may start.
+
+        Raises DomainUnavailable straight away if the domain's circuit is open,
+        or if pacing would hold the request back for more than `max_wait`.
+        """
+        domain = domain_of(url)
+        admitted = self.breaker.admit(domain)
+        if admitted is None:
+            raise DomainUnavailable(domain, self.breaker.retry_at(domain), 'circuit open')
+        with self._cond:
+            d = self._get(domain)
+            while d['in_flight'] >= int(d['limit']):
+                self._cond.wait()
+            now = self.clock()
+            start = max(now, d['next_allowed'])
+            if start - now > self.max_wait:
+                paced = True
+            else:
+                paced = False
+                d['in_flight'] += 1
+                d['next_allowed'] = start + d['interval']
+        if paced:
+            if admitted == 'trial':
+                self.breaker.abandon_trial(domain)
+            raise DomainUnavailable(domain, start, 'paced')
+        try:
+            if start > now:
+                self.sleep(start - now)
+            yield
+        finally:
+            with self._cond:
+                d['in_flight'] -= 1
+                self._cond.notify_all()
+            if admitted == 'trial':
+                # No-op when record_success/record_failure already settled the trial
+                self.breaker.abandon_trial(domain)
+
+    def record_success(self, url: str) -> None:
+        domain = domain_of(url)
+        with self._cond:
+            d = self._get(domain)
+            d['limit'] = min(float(self.max_concurrency), d['limit'] + 1.0 / d['limit'])
+            d['interval'] = max(self.min_interval, d['interval'] * 0.8)
+            self._cond.notify_all()
+        self.breaker.record_success(domain)
+
+    def record_failure(self, url: str, status: Optional[int] = None,
+                       retry_after: Optional[float] = None) -> float:
+        """Back off the domain and return the monotonic time it may be retried."""
+        domain = domain_of(url)
+        with self._cond:
+            d = self._get(domain)
+            d['limit'] = max(1.0, d['limit'] / 2)
+            d['interval'] = min(self.max_interval, d['interval'] * 2)
+            delay = max(d['interval'], min(retry_after or 0.0, self.max_retry_after))
+            d['next_allowed'] = max(d['next_allowed'], self.clock() + delay)
+            retry_at = d['next_allowed']
+        self.breaker.record_failure(domain)
+        print(f"[RateLimit] {domain} failed (status={status}); limit={int(d['limit'])}, interval={d['interval']:.1f}s")
+        if self.breaker.is_open(domain):
+            retry_at = max(retry_at, self.breaker.retry_at(domain))
+        return retry_at
+
+    def goto(self, page, url: str, errors=(), timeouts=()):
+        """
+        page.goto paced by this limiter. 429/5xx responses and exceptions of the
+        `errors`/`timeouts` types back off the domain and raise DomainUnavailable.
+        """
+        with self.slot(url):
+            try:
+                response = page.goto(url)
+            except timeouts:
+                raise DomainUnavailable(domain_of(url), self.record_failure(url), 'timeout')
+            except errors as e:
+                # Connection resets, DNS failures, aborted navigations
+                raise DomainUnavailable(domain_of(url), self.record_failure(url), str(e).splitlines()[0])
+            status = response.status if response else None
+            if status in RETRYABLE_STATUSES:
+                retry_after = parse_retry_after(response.headers.get('retry-after'))
+                retry_at = self.record_failure(url, status, retry_after)
+                raise DomainUnavailable(domain_of(url), retry_at, f'HTTP {status}')
+            self.record_success(url)
+        return response
+
+
+def parse_retry_after(value: Optional[str]) -> Optional[float]:
+    """Parse a Retry-After header given in seconds; HTTP dates are ignored."""
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        return None
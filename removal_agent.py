@@ -1,18 +1,27 @@
 import os
-from playwright.sync_api import sync_playwright
+import time
+import threading
+from playwright.sync_api import sync_playwright, Error as PlaywrightError, TimeoutError as PlaywrightTimeoutError
 from langgraph.graph import StateGraph
 from typing import Optional, List
 from datetime import datetime
 import sqlite3
 from dotenv import load_dotenv
 import anthropic
-from bs4 import BeautifulSoup
 from twocaptcha import TwoCaptcha
+from rate_limiter import DomainRateLimiter, DomainUnavailable, domain_of
+import scheduler
+from page_matcher import KeywordMatcher, scan_page, detect_captcha
+from browser_pool import BrowserPool
+from profiler import SERVICE_TIMER, NetworkRecorder, write_profile
 
 
 # Load environment variables from .env
 load_dotenv()
 
+# Set by --profile --html: serve a saved page and skip Claude, 2Captcha and DB writes
+OFFLINE = False
+
 # Actual Anthropic API call
 
 def ask_anthropic(question: str, context: str) -> str:
@@ -30,56 +39,29 @@ def ask_anthropic(question: str, context: str) -> str:
         f"If nothing is found, say 'No removal path found.'"
     )
     print(f"[Anthropic] Sending prompt to Claude: {question}")
-    response = client.messages.create(
-        model="claude-3-haiku-20240307",
-        max_tokens=256,
-        temperature=0.2,
-        messages=[{"role": "user", "content": prompt}]
-    )
+    if OFFLINE:
+        print("[Anthropic] Offline mode: skipping Claude call.")
+        return ""
+    with SERVICE_TIMER.track('claude'):
+        response = client.messages.create(
+            model="claude-3-haiku-20240307",
+            max_tokens=256,
+            temperature=0.2,
+            messages=[{"role": "user", "content": prompt}]
+        )
     answer = response.content[0].text.strip() if hasattr(response, 'content') and response.content else str(response)
     print(f"[Anthropic] Response: {answer}")
     return answer
 
-def extract_removal_candidates(html):
-    """
-    Extracts candidate elements (links, buttons, forms) that may be related to data removal.
-    Returns a list of dicts with text, type, and a simple selector.
-    """
-    soup = BeautifulSoup(html, 'html.parser')
-    candidates = []
-    keywords = ['remove', 'removal', 'do not use', 'opt out', 'delete', 'privacy', 'do not sell', 'unsubscribe']
-
-    # Find links and buttons
-    for tag in soup.find_all(['a', 'button', 'input']):
-        text = (tag.get_text() or '').strip() + ' ' + (tag.get('value') or '')
-        text = text.strip()
-        if any(kw in text.lower() for kw in keywords):
-            selector = ''
-            if tag.name == 'a' and tag.get('href'):
-                selector = f"a[href='{tag.get('href')}']"
-            elif tag.name == 'button' and tag.get('id'):
-                selector = f"button#{tag.get('id')}"
-            elif tag.name == 'input' and tag.get('name'):
-                selector = f"input[name='{tag.get('name')}']"
-            else:
-                selector = str(tag)[:80]  # fallback: truncated HTML
-            candidates.append({
-                'text': text,
-                'type': tag.name,
-                'selector': selector
-            })
-
-    # Find forms with relevant keywords in labels/placeholders
-    for form in soup.find_all('form'):
-        form_text = form.get_text(separator=' ', strip=True)
-        if any(kw in form_text.lower() for kw in keywords):
-            candidates.append({
-                'text': form_text[:100],
-                'type': 'form',
-                'selector': 'form'
-            })
-
-    return candidates
+# Comma-separated language codes from page_matcher.KEYWORDS; English when unset
+KEYWORD_LANGUAGES = os.getenv('REMOVAL_KEYWORD_LANGUAGES')
+KEYWORD_MATCHER = KeywordMatcher.from_languages(KEYWORD_LANGUAGES.split(',') if KEYWORD_LANGUAGES else None)
+
+def get_page_scan(state: dict) -> dict:
+    """Scan state['html'] once per page and cache the result in the state."""
+    if state.get('page_scan') is None:
+        state['page_scan'] = scan_page(state['html'], KEYWORD_MATCHER)
+    return state['page_scan']
 
 def build_claude_removal_prompt(candidates):
     """
@@ -114,6 +96,43 @@ os.makedirs(SCREENSHOT_DIR, exist_ok=True)
 
 DB_NAME = 'brokers.db'
 
+# Worker pool size and how many times a throttled/parked broker is requeued
+MAX_WORKERS = int(os.getenv('MAX_WORKERS', '4'))
+MAX_REQUEUES = int(os.getenv('MAX_REQUEUES', '3'))
+
+# Shared across all workers so every visit to a domain is paced together
+DOMAIN_LIMITER = DomainRateLimiter()
+
+def throttled_goto(page, url):
+    """page.goto paced by DOMAIN_LIMITER. Raises DomainUnavailable on 429/5xx/timeouts/network errors."""
+    return DOMAIN_LIMITER.goto(page, url, errors=PlaywrightError, timeouts=PlaywrightTimeoutError)
+
+# Warm browser contexts, one pool per worker thread (Playwright's sync API is thread-bound)
+BROWSER_POOL_SIZE = int(os.getenv('BROWSER_POOL_SIZE', '2'))
+BROWSER_CONTEXT_MAX_USES = int(os.getenv('BROWSER_CONTEXT_MAX_USES', '20'))
+BROWSER_CONTEXT_MAX_HEAP_MB = float(os.getenv('BROWSER_CONTEXT_MAX_HEAP_MB', '256'))
+BROWSER_STATE_DIR = os.getenv('BROWSER_STATE_DIR', 'browser_state') or None  # empty disables persistence
+_thread_local = threading.local()
+
+def get_browser_pool() -> BrowserPool:
+    pool = getattr(_thread_local, 'browser_pool', None)
+    if pool is None:
+        _thread_local.playwright = sync_playwright().start()
+        pool = BrowserPool(_thread_local.playwright, size=BROWSER_POOL_SIZE, max_uses=BROWSER_CONTEXT_MAX_USES,
+                           max_heap_mb=BROWSER_CONTEXT_MAX_HEAP_MB, storage_dir=BROWSER_STATE_DIR)
+        _thread_local.browser_pool = pool
+    return pool
+
+def close_browser_pool():
+    """Close the calling thread's browser pool, if it has one."""
+    pool = getattr(_thread_local, 'browser_pool', None)
+    if pool is None:
+        return
+    pool.close()
+    _thread_local.playwright.stop()
+    _thread_local.browser_pool = None
+    _thread_local.playwright = None
+
 def save_screenshot(page, step_name, broker_name=None):
     from datetime import datetime
     import re
@@ -131,59 +150,52 @@ def save_screenshot(page, step_name, broker_name=None):
 # --- Agent Steps ---
 def step_navigate(state: dict):
     print(f"[Step] Navigating to {state['url']}")
-    with sync_playwright() as p:
-        browser = p.chromium.launch(headless=True)
-        page = browser.new_page()
-        page.goto(state['url'])
+    with get_browser_pool().page(state['url']) as page:
+        throttled_goto(page, state['url'])
         broker_name = state.get('broker_name')
         screenshot_path = save_screenshot(page, "navigate", broker_name)
         state['screenshots'].append(screenshot_path)
         state['html'] = page.content()
-        browser.close()
+        state['page_scan'] = None
     print(f"[Step] Navigation complete.")
     return state
 
 def step_find_removal_path(state: dict):
     print("[Step] Finding removal path using local extraction and Claude reasoning...")
-    candidates = extract_removal_candidates(state['html'])
+    scan = get_page_scan(state)
+    candidates = scan['candidates']
     prompt = build_claude_removal_prompt(candidates)
     print("[Step] Claude prompt:\n", prompt)
     suggestion = ask_anthropic(prompt, "")  # Only send the prompt, not the full HTML
     state['steps'].append(f"Anthropic suggestion: {suggestion}")
-    import re
-    match = re.search(r'(opt[- ]?out|remove|do not sell|privacy|delete)', state['html'], re.I)
-    if match:
+    hint = scan['removal_hint']
+    if hint:
         state['status'] = 'removal_path_found'
-        state['steps'].append(f"Found likely removal path: {match.group(0)}")
-        print(f"[Step] Found likely removal path: {match.group(0)}")
+        state['steps'].append(f"Found likely removal path: {hint}")
+        print(f"[Step] Found likely removal path: {hint}")
     else:
         state['status'] = 'manual_intervention_required'
         state['result'] = 'Could not find removal path.'
         print("[Step] Could not find removal path. Manual intervention required.")
     # Screenshot logic (if needed)
-    with sync_playwright() as p:
-        browser = p.chromium.launch(headless=True)
-        page = browser.new_page()
-        page.goto(state['url'])
+    with get_browser_pool().page(state['url']) as page:
+        throttled_goto(page, state['url'])
         broker_name = state.get('broker_name')
         screenshot_path = save_screenshot(page, "find_removal_path", broker_name)
         state['screenshots'].append(screenshot_path)
-        browser.close()
     return state
 
 def step_find_form_or_email(state: dict):
     print("[Step] Looking for removal form or email address...")
-    from bs4 import BeautifulSoup
-    soup = BeautifulSoup(state['html'], 'html.parser')
-    form = soup.find('form')
+    scan = get_page_scan(state)
+    form = scan['forms'][0] if scan['forms'] else None
     if form:
         state['status'] = 'form_found'
         state['steps'].append('Found removal form.')
         state['form'] = form
         print("[Step] Found removal form.")
     else:
-        import re
-        emails = re.findall(r'[\w\.-]+@[\w\.-]+', state['html'])
+        emails = scan['emails']
         if emails:
             state['found_email'] = emails[0]
             state['status'] = 'email_found'
@@ -201,16 +213,14 @@ def step_find_form_or_email(state: dict):
 
 def step_submit_form(state: dict):
     print("[Step] Submitting removal form with Playwright...")
-    from bs4 import BeautifulSoup
-    import re
     import requests
     from twocaptcha import TwoCaptcha
     import tempfile
     import shutil
 
-    # Re-parse the HTML to find the form and its fields
-    soup = BeautifulSoup(state['html'], 'html.parser')
-    form = soup.find('form')
+    # Reuse the page scan to find the form and its fields
+    scan = get_page_scan(state)
+    form = scan['forms'][0] if scan['forms'] else None
     if not form:
         state['status'] = 'manual_intervention_required'
         state['result'] = 'No form found on page for submission.'
@@ -244,59 +254,7 @@ def step_submit_form(state: dict):
                 break
 
     # --- Captcha Detection ---
-    captcha_type = None
-    captcha_data = {}
-    # reCAPTCHA v2/v3
-    recaptcha_div = soup.find('div', class_=re.compile(r'g-recaptcha'))
-    recaptcha_script = soup.find('script', src=re.compile(r'recaptcha\/api\.js'))
-    if recaptcha_div or recaptcha_script:
-        sitekey = None
-        if recaptcha_div and recaptcha_div.has_attr('data-sitekey'):
-            sitekey = recaptcha_div['data-sitekey']
-        else:
-            # Try to find sitekey in any element
-            sitekey_tag = soup.find(attrs={'data-sitekey': True})
-            if sitekey_tag:
-                sitekey = sitekey_tag['data-sitekey']
-        if sitekey:
-            # Check for v3 by presence of 'grecaptcha.execute' or version param
-            if soup.find('script', string=re.compile(r'grecaptcha\.execute')) or 'v3' in str(recaptcha_script):
-                captcha_type = 'recaptcha_v3'
-            else:
-                captcha_type = 'recaptcha_v2'
-            captcha_data['sitekey'] = sitekey
-    # FunCaptcha
-    elif soup.find('script', src=re.compile(r'funcaptcha\.com')):
-        captcha_type = 'funcaptcha'
-    # GeeTest
-    elif soup.find('script', src=re.compile(r'geetest\.com')):
-        captcha_type = 'geetest'
-    # KeyCaptcha
-    elif soup.find('script', src=re.compile(r'keycaptcha\.com')):
-        captcha_type = 'keycaptcha'
-    # Capy
-    elif soup.find('script', src=re.compile(r'api\.capy\.me')):
-        captcha_type = 'capy'
-    # Grid/Canvas/ClickCaptcha/Rotate (look for canvas or keywords)
-    elif soup.find('canvas') or soup.find(string=re.compile(r'grid|canvas|click captcha|rotate', re.I)):
-        captcha_type = 'canvas_like'
-    # Normal Captcha (image)
-    else:
-        captcha_img = None
-        for img in soup.find_all('img'):
-            if 'captcha' in (img.get('src', '') + img.get('alt', '')).lower():
-                captcha_img = img
-                break
-        if captcha_img:
-            captcha_type = 'normal'
-            captcha_data['img_src'] = captcha_img.get('src')
-    # Text Captcha (look for question near input)
-    if not captcha_type:
-        for label in soup.find_all(['label', 'span', 'div', 'p']):
-            if re.search(r'(type the text|enter the answer|what day|solve|question)', label.get_text(), re.I):
-                captcha_type = 'text'
-                captcha_data['question'] = label.get_text(strip=True)
-                break
+    captcha_type, captcha_data = detect_captcha(scan['captcha'])
 
     print(f"[Captcha] Detected type: {captcha_type}")
     state['steps'].append(f"Detected captcha type: {captcha_type}")
@@ -310,50 +268,51 @@ def step_submit_form(state: dict):
         print(f"[Captcha] Could not instantiate TwoCaptcha solver: {e}")
         state['steps'].append(f"Could not instantiate TwoCaptcha solver: {e}")
 
-    if solver and captcha_type:
-        try:
-            if captcha_type == 'recaptcha_v2':
-                result = solver.recaptcha(sitekey=captcha_data['sitekey'], url=state['url'])
-                captcha_solution = result['code']
-            elif captcha_type == 'recaptcha_v3':
-                result = solver.recaptcha(sitekey=captcha_data['sitekey'], url=state['url'], version='v3')
-                captcha_solution = result['code']
-            elif captcha_type == 'normal':
-                # Download the image
-                img_url = captcha_data['img_src']
-                if not img_url.startswith('http'):
-                    # Make relative URLs absolute
-                    from urllib.parse import urljoin
-                    img_url = urljoin(state['url'], img_url)
-                with tempfile.NamedTemporaryFile(delete=False, suffix='.jpg') as tmp:
-                    resp = requests.get(img_url, stream=True)
-                    if resp.status_code == 200:
-                        shutil.copyfileobj(resp.raw, tmp)
-                        tmp_path = tmp.name
-                        result = solver.normal(tmp_path)
-                        captcha_solution = result['code']
-                        os.unlink(tmp_path)
-            elif captcha_type == 'text':
-                result = solver.text(captcha_data['question'])
-                captcha_solution = result['code']
-            else:
-                state['steps'].append(f"Captcha type {captcha_type} detected but not implemented for solving.")
-            if captcha_solution:
-                print(f"[Captcha] Solved: {captcha_solution}")
-                state['steps'].append(f"Captcha solved: {captcha_solution}")
-            else:
-                print(f"[Captcha] Could not solve captcha of type {captcha_type}")
-                state['steps'].append(f"Could not solve captcha of type {captcha_type}")
-        except Exception as e:
-            print(f"[Captcha] Error solving captcha: {e}")
-            state['steps'].append(f"Error solving captcha: {e}")
+    if OFFLINE and captcha_type:
+        print(f"[Captcha] Offline mode: not solving {captcha_type}")
+        state['steps'].append(f"Offline mode: skipped solving captcha of type {captcha_type}")
+    elif solver and captcha_type:
+        with SERVICE_TIMER.track('2captcha'):
+            try:
+                if captcha_type == 'recaptcha_v2':
+                    result = solver.recaptcha(sitekey=captcha_data['sitekey'], url=state['url'])
+                    captcha_solution = result['code']
+                elif captcha_type == 'recaptcha_v3':
+                    result = solver.recaptcha(sitekey=captcha_data['sitekey'], url=state['url'], version='v3')
+                    captcha_solution = result['code']
+                elif captcha_type == 'normal':
+                    # Download the image
+                    img_url = captcha_data['img_src']
+                    if not img_url.startswith('http'):
+                        # Make relative URLs absolute
+                        from urllib.parse import urljoin
+                        img_url = urljoin(state['url'], img_url)
+                    with tempfile.NamedTemporaryFile(delete=False, suffix='.jpg') as tmp:
+                        resp = requests.get(img_url, stream=True)
+                        if resp.status_code == 200:
+                            shutil.copyfileobj(resp.raw, tmp)
+                            tmp_path = tmp.name
+                            result = solver.normal(tmp_path)
+                            captcha_solution = result['code']
+                            os.unlink(tmp_path)
+                elif captcha_type == 'text':
+                    result = solver.text(captcha_data['question'])
+                    captcha_solution = result['code']
+                else:
+                    state['steps'].append(f"Captcha type {captcha_type} detected but not implemented for solving.")
+                if captcha_solution:
+                    print(f"[Captcha] Solved: {captcha_solution}")
+                    state['steps'].append(f"Captcha solved: {captcha_solution}")
+                else:
+                    print(f"[Captcha] Could not solve captcha of type {captcha_type}")
+                    state['steps'].append(f"Could not solve captcha of type {captcha_type}")
+            except Exception as e:
+                print(f"[Captcha] Error solving captcha: {e}")
+                state['steps'].append(f"Error solving captcha: {e}")
 
     # Use Playwright to fill and submit the form
-    from playwright.sync_api import sync_playwright
-    with sync_playwright() as p:
-        browser = p.chromium.launch(headless=True)
-        page = browser.new_page()
-        page.goto(state['url'])
+    with get_browser_pool().page(state['url']) as page:
+        throttled_goto(page, state['url'])
 
         # Fill the fields
         for name, value in field_values.items():
@@ -416,9 +375,10 @@ def step_submit_form(state: dict):
         state['status'] = 'form_submitted'
         state['result'] = 'Form submitted'
         state['steps'].append('Submitted removal form.')
-        browser.close()
 
-    if 'broker_id' in state and state['broker_id'] is not None:
+    if OFFLINE:
+        print("[DB] Offline mode: not updating broker submission.")
+    elif 'broker_id' in state and state['broker_id'] is not None:
         update_broker_submission(state['broker_id'])
         print(f"[DB] Updated brokerID {state['broker_id']} with removalState 'Requested' and current submissionDate.")
     print("[Step] Form submission complete.")
@@ -451,6 +411,14 @@ def get_brokers_to_process():
     print(f"[DB] Found {len(rows)} broker(s) to process.")
     return rows
 
+def get_broker(broker_id):
+    conn = sqlite3.connect(DB_NAME)
+    c = conn.cursor()
+    c.execute("SELECT brokerID, brokerName, brokerURL FROM brokers WHERE brokerID = ?", (broker_id,))
+    row = c.fetchone()
+    conn.close()
+    return row
+
 def update_broker_submission(broker_id):
     conn = sqlite3.connect(DB_NAME)
     c = conn.cursor()
@@ -510,7 +478,13 @@ def run_agent(url: str, broker_id: int = None, broker_name: str = None):
         "screenshots": [],
         # add any other fields your graph expects
     }
-    state = graph_app.invoke(state)
+    try:
+        state = graph_app.invoke(state)
+    except DomainUnavailable as e:
+        print(f"[Agent] Deferring {url}: {e}")
+        state['status'] = 'deferred'
+        state['result'] = f'Deferred: {e.reason}'
+        state['retry_at'] = e.retry_at
     print('[Agent] Steps:')
     for step in state.get('steps', []):
         print('  -', step)
@@ -521,8 +495,126 @@ def run_agent(url: str, broker_id: int = None, broker_name: str = None):
     print('[Agent] Finished processing.')
     return state
 
+def process_brokers(brokers, max_workers: int = MAX_WORKERS):
+    """
+    Run brokers on a worker pool. Brokers deferred by the rate limiter or an open
+    circuit are requeued for their retry time so workers keep moving on healthy sites.
+    """
+    return scheduler.process_brokers(
+        brokers,
+        lambda broker: run_agent(broker[2], broker[0], broker[1]),
+        max_workers=max_workers,
+        max_requeues=MAX_REQUEUES,
+        on_worker_exit=close_browser_pool,  # each worker closes the browser pool it owns
+    )
+
+def run_profile(url: str, broker_id: int = None, broker_name: str = None, html_path: str = None,
+                profile_dir: str = 'profiles', top: int = 25):
+    """
+    Run a single broker under cProfile and tracemalloc with Playwright tracing enabled and write
+    a combined report (CPU, allocations, network timings, Claude/2Captcha time) to `profile_dir`.
+    With `html_path` the run is fully offline: the saved page is served for each page's first
+    main-frame navigation, every other request is aborted, and Claude, 2Captcha and DB writes
+    are skipped. The report is written even if the run raises; the exception is then re-raised.
+    """
+    import cProfile
+    import tracemalloc
+    import re
+    global OFFLINE, DOMAIN_LIMITER
+    name = broker_name or domain_of(url)
+    run_dir = os.path.join(profile_dir, f"{re.sub(r'[^a-zA-Z0-9_-]', '_', name)[:40]}_{datetime.now().strftime('%Y%m%d_%H%M%S')}")
+    os.makedirs(run_dir, exist_ok=True)
+
+    network = NetworkRecorder()
+    on_page = network.attach
+    saved_html = None
+    if html_path:
+        with open(html_path, 'rb') as f:
+            saved_html = f.read()
+        def on_page(page):
+            network.attach(page)
+            served = []
+            # Match on the navigation itself: Playwright normalizes URLs (host case, fragment, port)
+            def serve_saved_page(route):
+                request = route.request
+                if not served and request.is_navigation_request() and request.frame == page.main_frame:
+                    served.append(True)
+                    route.fulfill(status=200, content_type='text/html', body=saved_html)
+                else:
+                    route.abort()
+            page.route('**/*', serve_saved_page)
+
+    # Offline mode and the profiling pool only apply to this run; restore the previous setup afterwards
+    previous_offline, previous_limiter = OFFLINE, DOMAIN_LIMITER
+    close_browser_pool()
+    profile = None
+    error = None
+    state = None
+    try:
+        if saved_html is not None:
+            OFFLINE = True
+            DOMAIN_LIMITER = DomainRateLimiter(min_interval=0.0)  # no pacing against a local page
+        _thread_local.playwright = sync_playwright().start()
+        _thread_local.browser_pool = BrowserPool(_thread_local.playwright, size=1, storage_dir=None,
+                                                 on_page=on_page, trace_dir=run_dir)
+        SERVICE_TIMER.reset()
+        tracemalloc.start()
+        started = time.perf_counter()
+        profile = cProfile.Profile()  # set last so the report is only written once timing has started
+        profile.enable()
+        try:
+            state = run_agent(url, broker_id, broker_name)
+        except BaseException as e:
+            error = e
+            raise
+        finally:
+            profile.disable()
+            wall_seconds = time.perf_counter() - started
+            snapshot = tracemalloc.take_snapshot()
+            tracemalloc.stop()
+    finally:
+        if getattr(_thread_local, 'browser_pool', None) is None and getattr(_thread_local, 'playwright', None):
+            _thread_local.playwright.stop()  # pool construction failed after Playwright started
+            _thread_local.playwright = None
+        close_browser_pool()  # also writes the Playwright traces
+        OFFLINE, DOMAIN_LIMITER = previous_offline, previous_limiter
+        if profile is not None:
+            try:
+                report_path = write_profile(run_dir, f"{name} ({url})", wall_seconds, profile, snapshot,
+                                            network.requests, SERVICE_TIMER.snapshot(), top=top, error=error)
+                print(f"[Profile] Report written to {report_path} (Playwright traces: {run_dir}/trace_*.zip)")
+            except Exception as e:
+                print(f"[Profile] Could not write report: {e}")
+    return state
+
 if __name__ == '__main__':
-    brokers = get_brokers_to_process()
-    for brokerID, brokerName, brokerURL in brokers:
-        print(f"\n[Main] Processing broker: {brokerName} ({brokerURL})")
-        run_agent(brokerURL, brokerID, brokerName)
+    import argparse
+    parser = argparse.ArgumentParser(description='Data broker removal agent')
+    parser.add_argument('--profile', action='store_true', help='Profile a single broker run and write a report')
+    parser.add_argument('--broker-id', type=int, help='Broker to profile (from brokers.db)')
+    parser.add_argument('--url', help='URL to profile instead of a broker from the DB')
+    parser.add_argument('--html', help='Saved page to serve for the URL; runs fully offline')
+    parser.add_argument('--profile-dir', help='Where profile reports are written (default: profiles)')
+    args = parser.parse_args()
+
+    profile_only = [flag for flag, value in (('--broker-id', args.broker_id), ('--url', args.url),
+                                             ('--html', args.html), ('--profile-dir', args.profile_dir))
+                    if value is not None]
+    if profile_only and not args.profile:
+        parser.error(f"{', '.join(profile_only)} only apply with --profile")
+    args.profile_dir = args.profile_dir or 'profiles'
+
+    if args.profile:
+        if args.broker_id is not None:
+            broker = get_broker(args.broker_id)
+            if not broker:
+                parser.error(f'No broker with brokerID {args.broker_id}')
+            brokerID, brokerName, brokerURL = broker
+            run_profile(args.url or brokerURL, brokerID, brokerName, args.html, args.profile_dir)
+        elif args.url:
+            run_profile(args.url, html_path=args.html, profile_dir=args.profile_dir)
+        else:
+            parser.error('--profile needs --broker-id or --url')
+    else:
+        brokers = get_brokers_to_process()
+        process_brokers(brokers)
@@ -0,0 +1,79 @@
+import heapq
+import queue
+import threading
+import time
+from typing import Callable, List, Optional
+
+
+def _worker(run_broker: Callable, jobs: queue.Queue, done: queue.Queue, on_exit: Optional[Callable]):
+    """Worker thread: run brokers from `jobs` until it gets None, then call `on_exit` on this thread."""
+    try:
+        while True:
+            job = jobs.get()
+            if job is None:
+                break
+            broker, attempts = job
+            try:
+                state = run_broker(broker)
+            except Exception as e:
+                print(f"[Main] Broker {broker[1]} failed: {e}")
+                state = None
+            done.put((broker, attempts, state))
+    finally:
+        if on_exit:
+            on_exit()
+
+
+def process_brokers(brokers, run_broker: Callable, max_workers: int = 4, max_requeues: int = 3,
+                    on_worker_exit: Optional[Callable] = None) -> List[dict]:
+    """
+    Run `run_broker(broker)` for each (brokerID, brokerName, brokerURL) on `max_workers` threads.
+
+    A broker whose state comes back with status 'deferred' is requeued for its `retry_at`
+    (a time.monotonic() timestamp) up to `max_requeues` times, so workers keep moving on
+    healthy brokers meanwhile. `on_worker_exit` runs on each worker thread before it exits.
+    Returns the final state of every broker that finished.
+    """
+    jobs = queue.Queue()
+    done = queue.Queue()
+    workers = [threading.Thread(target=_worker, args=(run_broker, jobs, done, on_worker_exit))
+               for _ in range(max_workers)]
+    for worker in workers:
+        worker.start()
+    delayed = [(0.0, seq, broker, 0) for seq, broker in enumerate(brokers)]  # (ready_at, seq, broker, attempts)
+    heapq.heapify(delayed)
+    seq = len(brokers)
+    running = 0
+    results = []
+    try:
+        while delayed or running:
+            now = time.monotonic()
+            while delayed and delayed[0][0] <= now and running < max_workers:
+                _, _, broker, attempts = heapq.heappop(delayed)
+                print(f"\n[Main] Processing broker: {broker[1]} ({broker[2]})")
+                jobs.put((broker, attempts))
+                running += 1
+            # Only wake for the next requeued broker when a worker is free to take it
+            if running < max_workers and delayed:
+                timeout = max(0.0, delayed[0][0] - now)
+            else:
+                timeout = None
+            try:
+                broker, attempts, state = done.get(timeout=timeout)
+            except queue.Empty:
+                continue
+            running -= 1
+            if state is None:
+                continue
+            if state.get('status') == 'deferred' and attempts < max_requeues:
+                print(f"[Main] Requeueing {broker[1]} in {max(0.0, state['retry_at'] - time.monotonic()):.0f}s")
+                heapq.heappush(delayed, (state['retry_at'], seq, broker, attempts + 1))
+                seq += 1
+            else:
+                results.append(state)
+    finally:
+        for _ in workers:
+            jobs.put(None)
+        for worker in workers:
+            worker.join()
+    return results
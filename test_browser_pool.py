@@ -0,0 +1,132 @@
+import json
+import os
+import tempfile
+import unittest
+from unittest.mock import MagicMock
+from browser_pool import BrowserPool
+
+class FakeContext:
+    def __init__(self, storage_state=None):
+        self.storage_state_seed = storage_state
+        self.closed = False
+        self.page_close_error = None
+        self.heap_mb = 10
+        self.cookies = []
+        self.init_scripts = []
+
+    def new_page(self):
+        page = MagicMock()
+        if self.page_close_error:
+            page.close.side_effect = self.page_close_error
+        return page
+
+    def new_cdp_session(self, page):
+        cdp = MagicMock()
+        cdp.send.side_effect = lambda method: {
+            'metrics': [{'name': 'JSHeapUsedSize', 'value': self.heap_mb * 1024 * 1024}]}
+        return cdp
+
+    def add_cookies(self, cookies):
+        self.cookies.extend(cookies)
+
+    def add_init_script(self, script=None):
+        self.init_scripts.append(script)
+
+    def storage_state(self, path=None):
+        with open(path, 'w') as f:
+            json.dump({'cookies': [{'name': 'consent', 'value': 'yes', 'domain': 'a.com', 'path': '/'}],
+                       'origins': [{'origin': 'https://a.com',
+                                    'localStorage': [{'name': 'banner', 'value': 'dismissed'}]}]}, f)
+
+    def close(self):
+        self.closed = True
+
+class FakeBrowser:
+    def __init__(self):
+        self.contexts = []
+
+    def new_context(self, storage_state=None):
+        context = FakeContext(storage_state)
+        self.contexts.append(context)
+        return context
+
+    def close(self):
+        pass
+
+def make_playwright():
+    playwright = MagicMock()
+    playwright.chromium.launch.return_value = FakeBrowser()
+    return playwright
+
+class TestBrowserPool(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+
+    def test_prewarms_and_reuses_context_per_domain(self):
+        pool = BrowserPool(make_playwright(), size=2, storage_dir=None)
+        self.assertEqual(len(pool._browser.contexts), 2)
+        with pool.page('https://a.com/x') as page:
+            first = page
+        # The spare taken for a.com is replaced
+        self.assertEqual(len(pool._spare), 2)
+        self.assertEqual(len(pool._browser.contexts), 3)
+        with pool.page('https://www.a.com/y'):
+            pass
+        # Same warm context reused, no new ones launched
+        self.assertEqual(len(pool._browser.contexts), 3)
+        self.assertTrue(first.close.called)
+
+    def test_spares_stay_topped_up_across_domains(self):
+        pool = BrowserPool(make_playwright(), size=2, storage_dir=None)
+        for domain in ('a.com', 'b.com', 'c.com', 'd.com'):
+            with pool.page(f'https://{domain}/'):
+                pass
+            self.assertEqual(len(pool._spare), 2)
+
+    def test_recycles_after_max_uses(self):
+        pool = BrowserPool(make_playwright(), size=1, max_uses=2, storage_dir=None)
+        for _ in range(2):
+            with pool.page('https://a.com/'):
+                pass
+        self.assertTrue(pool._browser.contexts[0].closed)
+        self.assertNotIn('a.com', pool._idle)
+
+    def test_drops_context_when_page_close_fails(self):
+        pool = BrowserPool(make_playwright(), size=1, storage_dir=None)
+        broken = pool._spare[0]
+        broken.page_close_error = RuntimeError('Target crashed')
+        with pool.page('https://a.com/'):
+            pass
+        self.assertTrue(broken.closed)
+        self.assertNotIn('a.com', pool._idle)
+
+    def test_persists_state_and_seeds_spare_from_it(self):
+        pool = BrowserPool(make_playwright(), size=1, max_uses=1, storage_dir=self.tmp.name)
+        with pool.page('https://a.com/'):
+            pass
+        path = os.path.join(self.tmp.name, 'a.com.json')
+        self.assertTrue(os.path.exists(path))
+        spare = pool._spare[0]
+        with pool.page('https://a.com/'):
+            pass
+        # The repeat visit is served by the pre-launched spare, seeded from the saved state
+        self.assertTrue(all(c.storage_state_seed is None for c in pool._browser.contexts))
+        self.assertEqual(spare.cookies[0]['name'], 'consent')
+        self.assertIn('"https://a.com"', spare.init_scripts[0])
+        self.assertIn('dismissed', spare.init_scripts[0])
+
+    def test_recycles_on_heap_high_water_mark(self):
+        pool = BrowserPool(make_playwright(), size=1, max_heap_mb=50, storage_dir=None)
+        context = pool._spare[0]
+        with pool.page('https://a.com/'):
+            pass
+        self.assertFalse(context.closed)
+        context.heap_mb = 80
+        with pool.page('https://a.com/'):
+            pass
+        self.assertTrue(context.closed)
+        self.assertNotIn('a.com', pool._idle)
+
+if __name__ == '__main__':
+    unittest.main()
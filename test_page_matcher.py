@@ -0,0 +1,102 @@
+import time
+import unittest
+from page_matcher import KEYWORDS, KeywordMatcher, scan_page, detect_captcha
+
+PAGE = """
+<html><body>
+  <div class="wrapper">
+    <a href="/privacy">Privacy Policy</a>
+    <a href="/about">About us</a>
+    <button id="optout">Opt Out</button>
+    <a href="/datenschutz">Datenschutz</a>
+    <p>Questions? Write to <a href="mailto:privacy@broker.example">privacy@broker.example</a> or help@broker.example</p>
+    <form action="/remove"><label>Remove my record</label><input name="email"><input type="submit" value="Delete my data"></form>
+  </div>
+</body></html>
+"""
+
+class TestKeywordMatcher(unittest.TestCase):
+    def test_case_insensitive_and_language_selection(self):
+        matcher = KeywordMatcher.from_languages(['en'])
+        self.assertEqual(matcher.search('Click to OPT OUT now'), 'OPT OUT')
+        self.assertIsNone(matcher.search('Datenschutz'))
+        self.assertEqual(KeywordMatcher.from_languages(['de']).search('Datenschutz'), 'Datenschutz')
+        self.assertEqual(KeywordMatcher(['foo']).search('a FOO b'), 'FOO')
+
+class TestScanPage(unittest.TestCase):
+    def test_candidates_emails_and_forms(self):
+        scan = scan_page(PAGE, KeywordMatcher.from_languages(['en']))
+        self.assertEqual([c['type'] for c in scan['candidates']], ['a', 'button', 'a', 'input', 'form'])
+        self.assertEqual(scan['candidates'][0]['selector'], "a[href='/privacy']")
+        self.assertEqual(scan['candidates'][1]['selector'], 'button#optout')
+        self.assertEqual(scan['emails'], ['privacy@broker.example', 'help@broker.example'])
+        self.assertEqual(len(scan['forms']), 1)
+        self.assertEqual(scan['removal_hint'].lower(), 'privacy')
+
+    def test_multilingual_candidates(self):
+        self.assertNotIn("a[href='/datenschutz']", [c['selector'] for c in scan_page(PAGE)['candidates']])
+        scan = scan_page(PAGE, KeywordMatcher.from_languages(['en', 'de']))
+        self.assertIn("a[href='/datenschutz']", [c['selector'] for c in scan['candidates']])
+
+    def test_whole_word_matching(self):
+        matcher = KeywordMatcher.from_languages(list(KEYWORDS))
+        scan = scan_page('<a href="/terms">Cancellation policy</a>', matcher)
+        self.assertEqual(scan['candidates'], [])
+        self.assertIsNone(scan['removal_hint'])
+
+    def test_inflections_match(self):
+        for phrase in ('Request to be removed', 'Removing your info', 'Deleted records', 'Opting out'):
+            scan = scan_page(f'<a href="/x">{phrase}</a>')
+            self.assertEqual(len(scan['candidates']), 1, phrase)
+            self.assertIsNotNone(scan['removal_hint'], phrase)
+
+    def test_scan_is_linear_in_nesting_depth(self):
+        def scan_time(depth):
+            html = '<div><span>x</span>' * depth + '<p>leaf</p>' + '</div>' * depth
+            started = time.perf_counter()
+            scan_page(html)
+            return time.perf_counter() - started
+        scan_time(100)  # warm up
+        small, large = min(scan_time(400) for _ in range(3)), min(scan_time(1600) for _ in range(3))
+        # 4x the nodes: linear is ~4x, the quadratic get_text-per-element version was ~16x
+        self.assertLess(large / small, 8)
+
+    def test_no_matches(self):
+        scan = scan_page('<html><body><a href="/home">Home</a></body></html>')
+        self.assertEqual(scan['candidates'], [])
+        self.assertIsNone(scan['removal_hint'])
+        self.assertEqual(detect_captcha(scan['captcha']), (None, {}))
+
+class TestDetectCaptcha(unittest.TestCase):
+    def test_recaptcha_v2(self):
+        html = ('<script src="https://www.google.com/recaptcha/api.js"></script>'
+                '<div class="g-recaptcha" data-sitekey="abc"></div>')
+        self.assertEqual(detect_captcha(scan_page(html)['captcha']), ('recaptcha_v2', {'sitekey': 'abc'}))
+
+    def test_recaptcha_v3(self):
+        html = ('<script src="https://www.google.com/recaptcha/api.js?render=abc"></script>'
+                '<span data-sitekey="abc"></span><script>grecaptcha.execute("abc")</script>')
+        self.assertEqual(detect_captcha(scan_page(html)['captcha'])[0], 'recaptcha_v3')
+
+    def test_script_and_image_captchas(self):
+        self.assertEqual(detect_captcha(scan_page('<script src="https://api.geetest.com/gt.js"></script>')['captcha'])[0], 'geetest')
+        captcha_type, data = detect_captcha(scan_page('<img src="/img/captcha.png">')['captcha'])
+        self.assertEqual((captcha_type, data), ('normal', {'img_src': '/img/captcha.png'}))
+
+    def test_text_captcha(self):
+        captcha_type, data = detect_captcha(scan_page('<form><label>Type the text: 3 + 4</label></form>')['captcha'])
+        self.assertEqual((captcha_type, data), ('text', {'question': 'Type the text: 3 + 4'}))
+
+    def test_text_captcha_split_across_tags(self):
+        html = '<div><p>Intro</p><label>Type the <b>text</b> shown</label><input name="captcha"></div>'
+        captcha_type, data = detect_captcha(scan_page(html)['captcha'])
+        self.assertEqual((captcha_type, data), ('text', {'question': 'Type the text shown'}))
+
+    def test_text_captcha_prefers_form_prompt(self):
+        html = ('<div><p>Questions? Contact us</p><form><label>Type the text shown: 3+4</label>'
+                '<input name="captcha_answer"></form></div>')
+        captcha_type, data = detect_captcha(scan_page(html)['captcha'])
+        self.assertEqual((captcha_type, data), ('text', {'question': 'Type the text shown: 3+4'}))
+
+if __name__ == '__main__':
+    unittest.main()
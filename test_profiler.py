@@ -0,0 +1,72 @@
+import cProfile
+import os
+import tempfile
+import tracemalloc
+import unittest
+from unittest.mock import MagicMock
+from profiler import ServiceTimer, NetworkRecorder, format_report, write_profile
+
+class TestServiceTimer(unittest.TestCase):
+    def test_tracks_calls_even_on_error(self):
+        timer = ServiceTimer()
+        with timer.track('claude'):
+            pass
+        with self.assertRaises(ValueError):
+            with timer.track('claude'):
+                raise ValueError()
+        count, total, longest = timer.snapshot()['claude']
+        self.assertEqual(count, 2)
+        self.assertGreaterEqual(total, longest)
+        timer.reset()
+        self.assertEqual(timer.snapshot(), {})
+
+class TestNetworkRecorder(unittest.TestCase):
+    def test_records_finished_and_failed_requests(self):
+        recorder = NetworkRecorder()
+        page = MagicMock()
+        recorder.attach(page)
+        handlers = {call.args[0]: call.args[1] for call in page.on.call_args_list}
+        ok = MagicMock(url='https://a.com/', method='GET', resource_type='document', timing={'responseEnd': 120.0})
+        failed = MagicMock(url='https://a.com/x.js', method='GET', resource_type='script', timing={'responseEnd': -1},
+                           failure='net::ERR_ABORTED')
+        handlers['requestfinished'](ok)
+        handlers['requestfailed'](failed)
+        self.assertEqual(recorder.requests[0]['duration_ms'], 120.0)
+        self.assertIsNone(recorder.requests[1]['duration_ms'])
+        self.assertEqual(recorder.requests[1]['failure'], 'net::ERR_ABORTED')
+
+class TestFormatReport(unittest.TestCase):
+    def test_report_sections(self):
+        profile = cProfile.Profile()
+        tracemalloc.start()
+        profile.enable()
+        sorted([str(i) for i in range(1000)])
+        profile.disable()
+        snapshot = tracemalloc.take_snapshot()
+        tracemalloc.stop()
+        network = [{'url': 'https://a.com/', 'method': 'GET', 'resource_type': 'document',
+                    'duration_ms': 42.0, 'failure': None}]
+        report = format_report('a.com', 1.5, profile, snapshot, network, {'claude': (1, 0.5, 0.5)}, top=5)
+        for section in ('External services', 'cumulative time', 'own time', 'allocation sites', 'Network requests'):
+            self.assertIn(section, report)
+        self.assertIn('claude', report)
+        self.assertIn('42ms', report)
+
+    def test_write_profile_records_failure(self):
+        profile = cProfile.Profile()
+        profile.enable()
+        sorted(range(10))
+        profile.disable()
+        tracemalloc.start()
+        snapshot = tracemalloc.take_snapshot()
+        tracemalloc.stop()
+        with tempfile.TemporaryDirectory() as run_dir:
+            path = write_profile(run_dir, 'a.com', 0.1, profile, snapshot, [], {},
+                                 error=RuntimeError('page crashed'))
+            with open(path) as f:
+                report = f.read()
+            self.assertIn('Run FAILED: RuntimeError: page crashed', report)
+            self.assertTrue(os.path.exists(os.path.join(run_dir, 'cpu.prof')))
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,170 @@
+import unittest
+from unittest.mock import MagicMock
+from rate_limiter import CircuitBreaker, DomainRateLimiter, DomainUnavailable, domain_of, parse_retry_after
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.now += seconds
+
+class TestDomainOf(unittest.TestCase):
+    def test_strips_www_and_case(self):
+        self.assertEqual(domain_of('https://WWW.Example.com/opt-out?x=1'), 'example.com')
+        self.assertEqual(domain_of('http://people.example.com'), 'people.example.com')
+
+    def test_parse_retry_after(self):
+        self.assertEqual(parse_retry_after('30'), 30.0)
+        self.assertIsNone(parse_retry_after('Wed, 21 Oct 2015 07:28:00 GMT'))
+        self.assertIsNone(parse_retry_after(None))
+
+class TestCircuitBreaker(unittest.TestCase):
+    def test_opens_after_threshold_and_half_opens(self):
+        clock = FakeClock()
+        breaker = CircuitBreaker(failure_threshold=2, reset_timeout=10, clock=clock)
+        breaker.record_failure('a.com')
+        self.assertTrue(breaker.allow('a.com'))
+        breaker.record_failure('a.com')
+        self.assertFalse(breaker.allow('a.com'))
+        self.assertTrue(breaker.allow('b.com'))
+        clock.now = 10
+        # One trial request only while half-open
+        self.assertTrue(breaker.allow('a.com'))
+        self.assertFalse(breaker.allow('a.com'))
+        breaker.record_success('a.com')
+        self.assertTrue(breaker.allow('a.com'))
+
+    def test_failed_trial_doubles_timeout(self):
+        clock = FakeClock()
+        breaker = CircuitBreaker(failure_threshold=1, reset_timeout=10, clock=clock)
+        breaker.record_failure('a.com')
+        clock.now = 10
+        self.assertTrue(breaker.allow('a.com'))
+        breaker.record_failure('a.com')
+        self.assertEqual(breaker.retry_at('a.com'), 30)
+
+class TestDomainRateLimiter(unittest.TestCase):
+    def setUp(self):
+        self.clock = FakeClock()
+        self.limiter = DomainRateLimiter(initial_concurrency=2, max_concurrency=4, min_interval=1.0,
+                                         breaker=CircuitBreaker(failure_threshold=2, clock=self.clock),
+                                         clock=self.clock, sleep=self.clock.sleep)
+
+    def test_paces_requests_per_domain(self):
+        with self.limiter.slot('https://a.com/1'):
+            pass
+        with self.limiter.slot('https://a.com/2'):
+            pass
+        self.assertEqual(self.clock.now, 1.0)
+        # Another domain is not held back by a.com's pacing
+        with self.limiter.slot('https://b.com/1'):
+            pass
+        self.assertEqual(self.clock.now, 1.0)
+
+    def test_failure_backs_off_and_success_recovers(self):
+        url = 'https://a.com/'
+        retry_at = self.limiter.record_failure(url, 503)
+        self.assertEqual(self.limiter.limit(url), 1)
+        self.assertEqual(self.limiter.interval(url), 2.0)
+        self.assertEqual(retry_at, 2.0)
+        for _ in range(10):
+            self.limiter.record_success(url)
+        self.assertEqual(self.limiter.interval(url), 1.0)
+        self.assertGreater(self.limiter.limit(url), 1)
+
+    def test_open_circuit_raises(self):
+        url = 'https://a.com/'
+        self.limiter.record_failure(url, 429)
+        retry_at = self.limiter.record_failure(url, 429, retry_after=5)
+        self.assertGreaterEqual(retry_at, 120)
+        with self.assertRaises(DomainUnavailable):
+            with self.limiter.slot(url):
+                pass
+
+    def test_trial_without_outcome_is_released(self):
+        url = 'https://a.com/'
+        self.limiter.record_failure(url, 503)
+        self.limiter.record_failure(url, 503)
+        self.clock.now = 1000
+        # Trial request ends with an unexpected error and records nothing
+        with self.assertRaises(RuntimeError):
+            with self.limiter.slot(url):
+                raise RuntimeError('net::ERR_CONNECTION_RESET')
+        with self.limiter.slot(url):
+            pass
+
+    def test_long_pacing_raises_instead_of_blocking(self):
+        url = 'https://a.com/'
+        retry_at = self.limiter.record_failure(url, 429, retry_after=3600)
+        # Retry-After is capped
+        self.assertEqual(retry_at, self.limiter.max_retry_after)
+        with self.assertRaises(DomainUnavailable) as ctx:
+            with self.limiter.slot(url):
+                pass
+        self.assertEqual(ctx.exception.reason, 'paced')
+        self.assertEqual(ctx.exception.retry_at, retry_at)
+        # Nothing was slept and no slot was leaked
+        self.assertEqual(self.clock.now, 0.0)
+        self.clock.now = retry_at
+        with self.limiter.slot(url):
+            pass
+
+class NavigationError(Exception):
+    pass
+
+class NavigationTimeout(NavigationError):
+    pass
+
+class TestGoto(unittest.TestCase):
+    def setUp(self):
+        self.clock = FakeClock()
+        self.limiter = DomainRateLimiter(min_interval=1.0, clock=self.clock, sleep=self.clock.sleep)
+        self.url = 'https://a.com/optout'
+
+    def goto(self, page):
+        return self.limiter.goto(page, self.url, errors=NavigationError, timeouts=NavigationTimeout)
+
+    def page(self, status=200, headers=None, error=None):
+        page = MagicMock()
+        if error:
+            page.goto.side_effect = error
+        else:
+            page.goto.return_value = MagicMock(status=status, headers=headers or {})
+        return page
+
+    def test_success(self):
+        page = self.page()
+        self.assertEqual(self.goto(page).status, 200)
+        self.assertEqual(self.limiter.interval(self.url), 1.0)
+
+    def test_404_is_not_a_failure(self):
+        self.assertEqual(self.goto(self.page(status=404)).status, 404)
+        self.assertEqual(self.limiter.interval(self.url), 1.0)
+
+    def test_retryable_status_defers(self):
+        with self.assertRaises(DomainUnavailable) as ctx:
+            self.goto(self.page(status=429, headers={'retry-after': '30'}))
+        self.assertEqual(ctx.exception.reason, 'HTTP 429')
+        self.assertEqual(ctx.exception.retry_at, 30.0)
+
+    def test_timeout_defers(self):
+        with self.assertRaises(DomainUnavailable) as ctx:
+            self.goto(self.page(error=NavigationTimeout('Timeout 30000ms exceeded')))
+        self.assertEqual(ctx.exception.reason, 'timeout')
+
+    def test_navigation_error_defers(self):
+        with self.assertRaises(DomainUnavailable) as ctx:
+            self.goto(self.page(error=NavigationError('net::ERR_CONNECTION_RESET at https://a.com/\nCall log:')))
+        self.assertEqual(ctx.exception.reason, 'net::ERR_CONNECTION_RESET at https://a.com/')
+        self.assertEqual(self.limiter.interval(self.url), 2.0)
+
+    def test_other_errors_propagate(self):
+        with self.assertRaises(ValueError):
+            self.goto(self.page(error=ValueError('bug')))
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,61 @@
+import threading
+import time
+import unittest
+from scheduler import process_brokers
+
+BROKERS = [(1, 'slow', 'https://slow.example'), (2, 'a', 'https://a.example'),
+           (3, 'b', 'https://b.example'), (4, 'c', 'https://c.example')]
+
+class FakeAgent:
+    """Stands in for run_agent: `deferrals` maps brokerName to how many times it is deferred."""
+    def __init__(self, deferrals, delay=0.3):
+        self.deferrals = dict(deferrals)
+        self.delay = delay
+        self.calls = []
+        self.lock = threading.Lock()
+
+    def __call__(self, broker):
+        brokerID, brokerName, brokerURL = broker
+        with self.lock:
+            self.calls.append((brokerName, time.monotonic()))
+            deferred = self.deferrals.get(brokerName, 0) > 0
+            if deferred:
+                self.deferrals[brokerName] -= 1
+        if deferred:
+            return {'broker_name': brokerName, 'status': 'deferred', 'retry_at': time.monotonic() + self.delay}
+        time.sleep(0.01)
+        return {'broker_name': brokerName, 'status': 'done'}
+
+class TestProcessBrokers(unittest.TestCase):
+    def test_deferred_broker_requeued_at_retry_at(self):
+        agent = FakeAgent({'slow': 1})
+        results = process_brokers(BROKERS, agent, max_workers=2, max_requeues=3)
+        self.assertEqual(sorted(r['broker_name'] for r in results), ['a', 'b', 'c', 'slow'])
+        slow_calls = [t for name, t in agent.calls if name == 'slow']
+        self.assertEqual(len(slow_calls), 2)
+        self.assertGreaterEqual(slow_calls[1] - slow_calls[0], agent.delay - 0.01)
+        # Healthy brokers finish while the deferred one waits
+        healthy = [t for name, t in agent.calls if name != 'slow']
+        self.assertTrue(all(t < slow_calls[1] for t in healthy))
+
+    def test_dropped_after_max_requeues(self):
+        agent = FakeAgent({'slow': 10}, delay=0.01)
+        results = process_brokers(BROKERS[:1], agent, max_workers=1, max_requeues=2)
+        self.assertEqual(len([name for name, _ in agent.calls if name == 'slow']), 3)
+        self.assertEqual([r['status'] for r in results], ['deferred'])
+
+    def test_worker_errors_and_exit_hook(self):
+        exited = []
+        def run_broker(broker):
+            if broker[1] == 'a':
+                raise RuntimeError('boom')
+            return {'broker_name': broker[1], 'status': 'done'}
+        results = process_brokers(BROKERS, run_broker, max_workers=2,
+                                  on_worker_exit=lambda: exited.append(threading.current_thread().name))
+        self.assertEqual(sorted(r['broker_name'] for r in results), ['b', 'c', 'slow'])
+        # Each worker ran the exit hook on its own thread
+        self.assertEqual(len(set(exited)), 2)
+        self.assertNotIn(threading.current_thread().name, exited)
+
+if __name__ == '__main__':
+    unittest.main()